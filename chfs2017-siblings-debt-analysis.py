@@ -1,11 +1,13 @@
 import pandas as pd
 import numpy as np
 import os
+import gc
+import re
+import hashlib
 import statsmodels.api as sm
-from statsmodels.stats.outliers_influence import variance_inflation_factor
-from scipy.stats.mstats import winsorize
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import RidgeCV
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
 import warnings
 
 # Suppress specific warnings if needed
@@ -16,8 +18,10 @@ warnings.simplefilter(action='ignore', category=UserWarning) # Ignore potential
 # --- Configuration ---
 hh_file_path = '/Users/lyahnw/Downloads/chfs2017_hh_202206.dta'
 ind_file_path = '/Users/lyahnw/Downloads/chfs2017_ind_202206.dta'
-# Updated output filename to reflect new models
+# Updated output filename to reflect new models (written as .parquet when pyarrow is installed)
 output_file_path = '/Users/lyahnw/Downloads/chfs2017_processed_siblings_debt_v7_multi_model.csv'
+# Print the full RLM summary table (standard errors, z-values, p-values) instead of coefficients only
+show_rlm_summary = False
 
 # --- Check if files exist ---
 if not os.path.exists(hh_file_path):
@@ -27,13 +31,179 @@ if not os.path.exists(ind_file_path):
     print(f"错误：个人文件未在 {ind_file_path} 找到")
     exit()
 
+# --- Define Asset and Debt Components (Variable names as provided before) ---
+print("正在定义资产和负债变量列表...")
+# (Variable lists remain the same as before - using the corrected ones from previous step)
+# --- Debt Variables ---
+debt_bus_bank = ['b3005b_2']; debt_bus_private = ['b3031a_2']; debt_bus_private_it = ['b3031ait_2']
+debt_house_bank = [f'c2064_{i}' for i in range(1, 7)]; debt_house_bank_it = [f'c2064it_{i}' for i in range(1, 7)]
+debt_house_other = [f'c3002a_{i}' for i in range(1, 7)]; debt_house_other_it = [f'c3002ait_{i}' for i in range(1, 7)]
+debt_house_agg_other = ['c2023e']; debt_house_agg_other_it = ['c2023eit']
+debt_house_collateral = ['c3017ca']; debt_house_collateral_it = ['c3017cait']
+debt_shop_bank = ['c3019c']; debt_shop_bank_it = ['c3019cit']; debt_shop_other = ['c3019e']; debt_shop_other_it = ['c3019eit']
+debt_car = ['c7060']; debt_car_it = ['c7060it']; debt_vehicle_other = ['c7061']; debt_vehicle_other_it = ['c7061it']
+debt_durable = ['c8007']; debt_durable_it = ['c8007it']
+debt_stock = ['d3116b']; debt_finance_other = ['d9108']; debt_finance_other_it = ['d9108it']
+debt_edu_bank = ['e1006']; debt_edu_bank_it = ['e1006it']; debt_edu_private = ['e1022']; debt_edu_private_it = ['e1022it']
+debt_medical = ['e4003']; debt_medical_it = ['e4003it']; debt_other = ['e3003c']; debt_other_it = ['e3003cit']
+all_debt_exact_vars = (debt_bus_bank + debt_bus_private + debt_house_bank + debt_house_other + debt_house_agg_other + debt_house_collateral + debt_shop_bank + debt_shop_other + debt_car + debt_vehicle_other + debt_durable + debt_stock + debt_finance_other + debt_edu_bank + debt_edu_private + debt_medical + debt_other)
+all_debt_interval_vars = (debt_bus_private_it + debt_house_bank_it + debt_house_other_it + debt_house_agg_other_it + debt_house_collateral_it + debt_shop_bank_it + debt_shop_other_it + debt_car_it + debt_vehicle_other_it + debt_durable_it + debt_finance_other_it + debt_edu_bank_it + debt_edu_private_it + debt_medical_it + debt_other_it)
+
+# --- Asset Variables ---
+asset_bus = ['b2003d']; asset_bus_it = ['b2003dit']
+asset_house = [f'c2016_{i}' for i in range(1, 7)]; asset_house_it = [f'c2016it_{i}' for i in range(1, 7)]
+asset_house_agg_other = ['c2023d']; asset_house_agg_other_it = ['c2023dit']
+asset_shop = ['c3019a']; asset_shop_it = ['c3019ait']
+asset_car = ['c7052b']; asset_car_it = ['c7052bit']; asset_vehicle_comm = ['c7059']; asset_vehicle_other = ['c7058']
+vehicle_in_business_col = 'c7062'; vehicle_in_business_col_it = 'c7062it'
+asset_durable = ['c8002']; asset_other_nonfin = ['c8005']
+asset_deposit_checking = ['d1105']; asset_deposit_checking_it = ['d1105it']; asset_deposit_savings = ['d2104']; asset_deposit_savings_it = ['d2104it']
+asset_stock_cash = ['d3103']; asset_stock_cash_it = ['d3103it']; asset_stock_value = ['d3109']; asset_stock_value_it = ['d3109it']; asset_stock_nonpublic = ['d3116']; asset_stock_nonpublic_it = ['d3116it']
+asset_fund = ['d5107']; asset_fund_it = ['d5107it']; asset_internet_finance = ['d7106h']; asset_internet_finance_it = ['d7106hit']; asset_other_finance_prod = ['d7110a']; asset_other_finance_prod_it = ['d7110ait']
+asset_bond = [f'd4103_{i}' for i in range(1, 6)]; asset_bond_it = [f'd4103it_{i}' for i in range(1, 6)]
+asset_derivative = ['d6100a']; asset_derivative_it = ['d6100ait']; asset_non_rmb = ['d8104']; asset_non_rmb_it = ['d8104it']; asset_gold = ['d9103']; asset_gold_it = ['d9103it']; asset_other_fin = ['d9110a']; asset_other_fin_it = ['d9110ait']
+asset_cash = ['k1101']; asset_cash_it = ['k1101it']; asset_receivable = ['k2102c']; asset_receivable_it = ['k2102cit']
+all_asset_exact_vars = (asset_bus + asset_house + asset_house_agg_other + asset_shop + asset_car + asset_vehicle_comm + asset_vehicle_other + asset_durable + asset_other_nonfin + asset_deposit_checking + asset_deposit_savings + asset_stock_cash + asset_stock_value + asset_stock_nonpublic + asset_fund + asset_internet_finance + asset_other_finance_prod + asset_bond + asset_derivative + asset_non_rmb + asset_gold + asset_other_fin + asset_cash + asset_receivable)
+all_asset_interval_vars = (asset_bus_it + asset_house_it + asset_house_agg_other_it + asset_shop_it + asset_car_it + asset_deposit_checking_it + asset_deposit_savings_it + asset_stock_cash_it + asset_stock_value_it + asset_stock_nonpublic_it + asset_fund_it + asset_internet_finance_it + asset_other_finance_prod_it + asset_bond_it + asset_derivative_it + asset_non_rmb_it + asset_gold_it + asset_other_fin_it + asset_cash_it + asset_receivable_it)
+
+# --- Columns Required from Each File ---
+# Only these columns are read from the Stata files; anything absent from a file is skipped here
+# and handled by the existing-column checks further down.
+head_relation_var = 'a2001' # Relation to respondent; 1 = respondent (head proxy)
+IND_COLS_NEEDED = ['hhid', 'a2001', 'a2003', 'a2005', 'a2012', 'a2024', 'a2025b', 'a2028', 'a2029']
+HH_COLS_NEEDED = list(dict.fromkeys(['hhid', 'b2000b', 'c2002', vehicle_in_business_col, vehicle_in_business_col_it] +
+                                    all_debt_exact_vars + all_debt_interval_vars +
+                                    all_asset_exact_vars + all_asset_interval_vars))
+
+
+def read_stata_columns(path, columns, row_filter=None, chunksize=200_000):
+    """
+    读取 Stata 文件中指定的列；文件中不存在的列会被跳过。
+
+    Args:
+        path (str): Stata 文件路径。
+        columns (list): 需要读取的列名。
+        row_filter (callable, optional): 若提供，则按块 (chunksize 行) 读取文件，
+            对每块调用 row_filter(chunk) 只保留所需行，避免整表驻留内存。
+        chunksize (int): 按块读取时每块的行数。
+
+    Returns:
+        pd.DataFrame: 仅包含文件中实际存在的所需列（及 row_filter 保留的行）。
+    """
+    with pd.read_stata(path, iterator=True) as reader:
+        available = reader.variable_labels().keys()
+    columns = [col for col in columns if col in available]
+    if row_filter is None:
+        return pd.read_stata(path, columns=columns, convert_categoricals=False)
+    with pd.read_stata(path, columns=columns, convert_categoricals=False,
+                       iterator=True, chunksize=chunksize) as reader:
+        return pd.concat([row_filter(chunk) for chunk in reader])
+
+
+def downcast_numeric(df, skip=()):
+    """
+    将数值列就地降为能无损容纳其取值的最小类型 (float64 -> float32, int64 -> int8/int16/int32)。
+
+    整数列用 pd.to_numeric 降级（整数降级总是精确的）；浮点列只有在 float32 往返转换后与原值完全相同时才降级，
+    因为 pd.to_numeric(downcast='float') 允许约 5e-4 的绝对误差，会改变带小数的金额。
+
+    Args:
+        df (pd.DataFrame): 需要降级的数据。
+        skip (iterable): 不做处理的列名（如合并键）。
+
+    Returns:
+        pd.DataFrame: 降级后的同一数据。
+    """
+    for col in df.select_dtypes(include='float').columns.difference(skip):
+        as_float32 = df[col].astype(np.float32)
+        if as_float32.astype(df[col].dtype).equals(df[col]): # Lossless round trip only
+            df[col] = as_float32
+    for col in df.select_dtypes(include='integer').columns.difference(skip):
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def keep_head_rows(chunk):
+    """只保留户主代理（问卷回答者）所在的行。"""
+    if head_relation_var not in chunk.columns:
+        return chunk
+    return chunk[chunk[head_relation_var] == 1]
+
+
+def filter_fingerprint(row_filter):
+    """
+    生成行过滤函数的指纹：函数名、字节码、常量以及它引用的标量全局变量（如 head_relation_var）。
+
+    Args:
+        row_filter (callable or None): 行过滤函数。
+
+    Returns:
+        tuple or None: 可用于缓存键的指纹。
+    """
+    if row_filter is None:
+        return None
+    code = getattr(row_filter, '__code__', None)
+    if code is None: # Not a plain function, fall back to its name
+        return getattr(row_filter, '__qualname__', repr(row_filter))
+    scope = getattr(row_filter, '__globals__', {})
+    referenced = sorted((name, repr(scope[name])) for name in code.co_names
+                        if isinstance(scope.get(name), (str, int, float, bool)))
+    return (row_filter.__qualname__, code.co_code, repr(code.co_consts), referenced)
+
+
+def load_or_cache(path, columns, row_filter=None):
+    """
+    按文件后缀读取数据：.parquet 直接读取所需列；.dta 则读取所需列后缓存为 Parquet，
+    之后只要缓存不旧于 .dta 文件就直接读取缓存，避免每次运行都重新解析 Stata。
+    缓存文件名包含 columns 与 row_filter 指纹（字节码及其引用的标量全局变量）的哈希，
+    修改列清单、过滤函数本身或 head_relation_var 等设置后会自动重建缓存。
+    缓存读写失败（未安装 pyarrow、目录只读、磁盘已满等）只会跳过缓存，不影响数据读取。
+
+    Args:
+        path (str): 数据文件路径 (.dta 或 .parquet)。
+        columns (list): 需要读取的列名。
+        row_filter (callable, optional): 见 read_stata_columns。
+
+    Returns:
+        pd.DataFrame: 读取的数据。
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        available = set(pq.read_schema(path).names)
+        df = pd.read_parquet(path, columns=[c for c in columns if c in available])
+        return row_filter(df) if row_filter is not None else df
+    # Key the cache on what was requested, so a changed column list or filter never reuses it
+    request_key = hashlib.sha1(repr((list(columns), filter_fingerprint(row_filter))).encode('utf-8')).hexdigest()[:12]
+    cache_path = f"{path}.{request_key}.parquet"
+    if os.path.isfile(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        try:
+            df = pd.read_parquet(cache_path)
+            print(f"使用 Parquet 缓存: {cache_path}")
+            return df
+        except Exception as e:
+            print(f"提示：读取 Parquet 缓存失败 ({e})，改为读取 Stata 文件。")
+    df = read_stata_columns(path, columns, row_filter=row_filter)
+    try:
+        df.to_parquet(cache_path, engine='pyarrow', compression='zstd', index=False)
+        print(f"已将所需列缓存为 Parquet: {cache_path}")
+    except ImportError:
+        print("提示：未安装 pyarrow，跳过 Parquet 缓存。")
+    except Exception as e: # Read-only directory, full disk, unconvertible column, ...
+        print(f"提示：写入 Parquet 缓存失败 ({e})，跳过缓存。")
+        try:
+            os.remove(cache_path) # Do not leave a partial file behind
+        except OSError:
+            pass
+    return df
+
+
 print("正在加载数据...")
 # --- Load Data ---
 try:
-    hh_df = pd.read_stata(hh_file_path, convert_categoricals=False)
+    hh_df = downcast_numeric(load_or_cache(hh_file_path, HH_COLS_NEEDED), skip=['hhid', 'head_age', 'head_siblings'])
     print(f"家庭数据已加载，包含 {len(hh_df)} 行， {len(hh_df.columns)} 列。")
-    ind_df = pd.read_stata(ind_file_path, convert_categoricals=False)
-    print(f"个人数据已加载，包含 {len(ind_df)} 行， {len(ind_df.columns)} 列。")
+    ind_df = load_or_cache(ind_file_path, IND_COLS_NEEDED, row_filter=keep_head_rows)
+    print(f"个人数据已加载（仅户主代理行），包含 {len(ind_df)} 行， {len(ind_df.columns)} 列。")
     print("数据加载成功。")
 except Exception as e:
     print(f"加载 Stata 文件时出错: {e}")
@@ -41,34 +211,34 @@ except Exception as e:
 
 # --- Process Individual Data (ind_df) ---
 print("正在处理个人数据以查找户主（问卷回答者代理）信息...")
-head_relation_var = 'a2001'
 if head_relation_var not in ind_df.columns:
      print(f"错误: 无法在个人数据中找到用于识别户主代理的变量 '{head_relation_var}'。")
      exit()
-heads_df = ind_df[ind_df[head_relation_var] == 1].copy()
+heads_df = ind_df # Already restricted to head rows while loading
 print(f"识别出 {len(heads_df)} 位户主代理（问卷回答者）。")
 
 # Calculate Head's Age
 if 'a2005' not in heads_df.columns:
     print("错误：个人数据中缺少 'a2005' (出生年份) 列。")
     exit()
-heads_df['head_age'] = 2017 - heads_df['a2005']
+# Missing birth years give a NaN age, which the >= 16 filter below drops
+head_age = 2017 - heads_df['a2005'].to_numpy(dtype=np.float64)
 
 # --- Add Age Filter for Head (>=16) ---
 # Filter out heads younger than 16 (as per questionnaire logic for respondent)
-initial_head_count = len(heads_df)
-heads_df = heads_df[heads_df['head_age'] >= 16].copy()
-removed_count = initial_head_count - len(heads_df)
+keep_heads = head_age >= 16
+head_age = head_age[keep_heads].astype(np.int16)
+removed_count = len(heads_df) - int(keep_heads.sum())
 if removed_count > 0:
     print(f"已应用年龄筛选 (head_age >= 16)，排除了 {removed_count} 位年龄异常的户主代理。")
 
 
 # Calculate Head's Total Siblings (A2028: brothers, A2029: sisters)
 # Questionnaire Q69, Q70 state these are asked only for respondent/spouse aged 40 or below
-if 'a2028' not in heads_df.columns: heads_df['a2028'] = 0
-if 'a2029' not in heads_df.columns: heads_df['a2029'] = 0
-heads_df['head_siblings_raw'] = heads_df['a2028'].fillna(0) + heads_df['a2029'].fillna(0)
-heads_df['head_siblings'] = np.where(heads_df['head_age'] <= 40, heads_df['head_siblings_raw'], np.nan)
+sibling_cols = [col for col in ['a2028', 'a2029'] if col in heads_df.columns] # Missing columns count as 0
+head_siblings = heads_df[sibling_cols].fillna(0).to_numpy(dtype=np.float32).sum(axis=1)[keep_heads]
+head_siblings[head_age > 40] = np.nan
+heads_df = heads_df[keep_heads].assign(head_age=head_age, head_siblings=head_siblings)
 
 # Select relevant head columns to merge
 head_control_cols_map = {
@@ -83,202 +253,143 @@ head_control_cols_map = {
 head_cols_to_select = [col for col in head_control_cols_map.keys() if col in heads_df.columns]
 final_head_cols_map = {k: v for k, v in head_control_cols_map.items() if k in head_cols_to_select}
 head_info_to_merge = heads_df[head_cols_to_select].rename(columns=final_head_cols_map)
-head_info_to_merge = head_info_to_merge.drop_duplicates(subset=['hhid'], keep='first')
+head_info_to_merge = head_info_to_merge.drop_duplicates(subset=['hhid'], keep='first').set_index('hhid')
+# Small categorical codes as nullable Int8 so households without a head do not upcast them to float64
+for col in ['head_sex', 'head_educ', 'head_marital', 'head_health']:
+    if col in head_info_to_merge.columns:
+        head_info_to_merge[col] = head_info_to_merge[col].astype('Int8')
 print(f"准备合并 {len(head_info_to_merge)} 个家庭的户主代理信息。")
 
 # --- Merge Head Info into Household Data (hh_df) ---
 print("正在将户主代理信息合并到家庭数据中...")
-original_hh_rows = len(hh_df)
-hh_df = pd.merge(hh_df, head_info_to_merge, on='hhid', how='left')
-if len(hh_df) != original_hh_rows:
-    print(f"警告：合并后行数发生变化（从 {original_hh_rows} 到 {len(hh_df)}），请检查合并键 'hhid' 的唯一性。")
-
-
-# --- Define Asset and Debt Components (Variable names as provided before) ---
-print("正在定义资产和负债变量列表...")
-# (Variable lists remain the same as before - using the corrected ones from previous step)
-# --- Debt Variables ---
-debt_bus_bank = ['b3005b_2']; debt_bus_private = ['b3031a_2']; debt_bus_private_it = ['b3031ait_2']
-debt_house_bank = [f'c2064_{i}' for i in range(1, 7)]; debt_house_bank_it = [f'c2064it_{i}' for i in range(1, 7)]
-debt_house_other = [f'c3002a_{i}' for i in range(1, 7)]; debt_house_other_it = [f'c3002ait_{i}' for i in range(1, 7)]
-debt_house_agg_other = ['c2023e']; debt_house_agg_other_it = ['c2023eit']
-debt_house_collateral = ['c3017ca']; debt_house_collateral_it = ['c3017cait']
-debt_shop_bank = ['c3019c']; debt_shop_bank_it = ['c3019cit']; debt_shop_other = ['c3019e']; debt_shop_other_it = ['c3019eit']
-debt_car = ['c7060']; debt_car_it = ['c7060it']; debt_vehicle_other = ['c7061']; debt_vehicle_other_it = ['c7061it']
-debt_durable = ['c8007']; debt_durable_it = ['c8007it']
-debt_stock = ['d3116b']; debt_finance_other = ['d9108']; debt_finance_other_it = ['d9108it']
-debt_edu_bank = ['e1006']; debt_edu_bank_it = ['e1006it']; debt_edu_private = ['e1022']; debt_edu_private_it = ['e1022it']
-debt_medical = ['e4003']; debt_medical_it = ['e4003it']; debt_other = ['e3003c']; debt_other_it = ['e3003cit']
-all_debt_exact_vars = (debt_bus_bank + debt_bus_private + debt_house_bank + debt_house_other + debt_house_agg_other + debt_house_collateral + debt_shop_bank + debt_shop_other + debt_car + debt_vehicle_other + debt_durable + debt_stock + debt_finance_other + debt_edu_bank + debt_edu_private + debt_medical + debt_other)
-all_debt_interval_vars = (debt_bus_private_it + debt_house_bank_it + debt_house_other_it + debt_house_agg_other_it + debt_house_collateral_it + debt_shop_bank_it + debt_shop_other_it + debt_car_it + debt_vehicle_other_it + debt_durable_it + debt_finance_other_it + debt_edu_bank_it + debt_edu_private_it + debt_medical_it + debt_other_it)
-
-# --- Asset Variables ---
-asset_bus = ['b2003d']; asset_bus_it = ['b2003dit']
-asset_house = [f'c2016_{i}' for i in range(1, 7)]; asset_house_it = [f'c2016it_{i}' for i in range(1, 7)]
-asset_house_agg_other = ['c2023d']; asset_house_agg_other_it = ['c2023dit']
-asset_shop = ['c3019a']; asset_shop_it = ['c3019ait']
-asset_car = ['c7052b']; asset_car_it = ['c7052bit']; asset_vehicle_comm = ['c7059']; asset_vehicle_other = ['c7058']
-vehicle_in_business_col = 'c7062'; vehicle_in_business_col_it = 'c7062it'
-asset_durable = ['c8002']; asset_other_nonfin = ['c8005']
-asset_deposit_checking = ['d1105']; asset_deposit_checking_it = ['d1105it']; asset_deposit_savings = ['d2104']; asset_deposit_savings_it = ['d2104it']
-asset_stock_cash = ['d3103']; asset_stock_cash_it = ['d3103it']; asset_stock_value = ['d3109']; asset_stock_value_it = ['d3109it']; asset_stock_nonpublic = ['d3116']; asset_stock_nonpublic_it = ['d3116it']
-asset_fund = ['d5107']; asset_fund_it = ['d5107it']; asset_internet_finance = ['d7106h']; asset_internet_finance_it = ['d7106hit']; asset_other_finance_prod = ['d7110a']; asset_other_finance_prod_it = ['d7110ait']
-asset_bond = [f'd4103_{i}' for i in range(1, 6)]; asset_bond_it = [f'd4103it_{i}' for i in range(1, 6)]
-asset_derivative = ['d6100a']; asset_derivative_it = ['d6100ait']; asset_non_rmb = ['d8104']; asset_non_rmb_it = ['d8104it']; asset_gold = ['d9103']; asset_gold_it = ['d9103it']; asset_other_fin = ['d9110a']; asset_other_fin_it = ['d9110ait']
-asset_cash = ['k1101']; asset_cash_it = ['k1101it']; asset_receivable = ['k2102c']; asset_receivable_it = ['k2102cit']
-all_asset_exact_vars = (asset_bus + asset_house + asset_house_agg_other + asset_shop + asset_car + asset_vehicle_comm + asset_vehicle_other + asset_durable + asset_other_nonfin + asset_deposit_checking + asset_deposit_savings + asset_stock_cash + asset_stock_value + asset_stock_nonpublic + asset_fund + asset_internet_finance + asset_other_finance_prod + asset_bond + asset_derivative + asset_non_rmb + asset_gold + asset_other_fin + asset_cash + asset_receivable)
-all_asset_interval_vars = (asset_bus_it + asset_house_it + asset_house_agg_other_it + asset_shop_it + asset_car_it + asset_deposit_checking_it + asset_deposit_savings_it + asset_stock_cash_it + asset_stock_value_it + asset_stock_nonpublic_it + asset_fund_it + asset_internet_finance_it + asset_other_finance_prod_it + asset_bond_it + asset_derivative_it + asset_non_rmb_it + asset_gold_it + asset_other_fin_it + asset_cash_it + asset_receivable_it)
-
-
-# --- Helper Function to Calculate Midpoints (Corrected based on Questionnaire) ---
-def get_midpoint(interval_code, var_name):
-    """
-    根据 CHFS 2017 问卷定义，计算区间变量的中点值（单位：元 或 平方米）。
-    对“X以上”的开放区间，使用下限的1.5倍作为估计。
-
-    Args:
-        interval_code (float/int): 问卷中记录的区间编码。
-        var_name (str): 区间变量的名称 (e.g., 'b2003ait', 'c2016it_1')。
-
-    Returns:
-        float: 计算出的中点值，如果无法匹配则返回 np.nan。
-    """
-    if pd.isna(interval_code):
-        return np.nan
-
-    # Remove suffix like _1, _2 for general mapping if needed (depends on how vars are listed)
-    base_var_name = var_name.split('_')[0] if '_' in var_name and var_name[-2]=='_' else var_name # Handle c2016it_1 etc.
-
-    # --- Define Mappings based on Questionnaire ---
-    # Note: Upper bound estimation uses 1.5 * lower bound
-
-    # Mapping 1: Q158, Q172, Q181, Q184, Q187, Q565, Q567, Q614, Q587, Q589, Q618, Q623, Q627, Q631, Q649, Q460
-    map1 = {1: 5000, 2: 20000, 3: 40000, 4: 60000, 5: 85000, 6: 200000, 7: 400000, 8: 750000, 9: 3000000, 10: 7500000, 11: 15000000}
-    vars_map1 = ['b2003ait', 'b2050it', 'b2059it', 'b2063it', 'b2080it', 'd3109it', 'd3110it', 'd4103it',
-                 'd5107it', 'd5108it', 'd6100ait', 'd8104it', 'd9103it', 'd9110ait', 'k2102cit', 'c3019ait']
-
-    # Mapping 2: Q162, Q175 (Same as Map 1)
-    map2 = map1
-    vars_map2 = ['b2003bit', 'b2052it']
-
-    # Mapping 3: Q164, Q178, Q120, Q579, Q170, Q213, Q215, Q217, Q219, Q238, Q240, Q242, Q244, Q261, Q452, Q463, Q466, Q481, Q483, Q513, Q515, Q541, Q546, Q549, Q560, Q599, Q607, Q663, Q670, Q698, Q678, Q851, Q351
-    map3 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 7500000}
-    vars_map3 = ['b2003eit', 'b2055it', 'a3136it', 'd3117it', 'b2046it', 'b3004bit', 'b3005bit', 'b3005it', 'b3006ait',
-                 'b3030dit', 'b3030eit', 'b3031ait', 'b3045cit', 'b3056ait', 'c3017cait', 'c3019cit', 'c3019eit',
-                 'c7052bit', 'c7060it', 'c7061it', 'c7062it', 'c8007it', 'd1105it', 'd2104it', 'd3103it', 'd7106hit',
-                 'd7110ait', 'e1006it', 'e1022it', 'e3003cit', 'e4003it', 'h2004it', 'c2035ait']
-
-    # Mapping 4: Q190, Q122, Q124, Q126, Q205, Q595, Q601, Q609, Q629, Q637, Q633, Q646, Q660, Q716, Q722
-    map4 = {1: 2500, 2: 7500, 3: 15000, 4: 35000, 5: 75000, 6: 125000, 7: 175000, 8: 250000, 9: 400000, 10: 750000, 11: 1500000}
-    vars_map4 = ['b2093it', 'a3136ait', 'a3136bit', 'a3137it', 'b2110it', 'd5109it', 'd7106jit', 'd7112it',
-                 'd9105it', 'd9108it', 'd9110bit', 'k1101it', 'k2208it', 'f1010it', 'f1031it']
-
-    # Mapping 5: Q230
-    map5 = {1: 500, 2: 1500, 3: 3500, 4: 7500, 5: 15000, 6: 35000, 7: 75000, 8: 150000}
-    vars_map5 = ['b3008fit']
-
-    # Mapping 6: Q282 (Unit: sqm)
-    map6 = {1: 25, 2: 60.5, 3: 80.5, 4: 95.5, 5: 110.5, 6: 132, 7: 172, 8: 300}
-    vars_map6 = ['c1000bbit']
-
-    # Mapping 7: Q284
-    map7 = {1: 50000, 2: 200000, 3: 400000, 4: 600000, 5: 850000, 6: 1250000, 7: 2250000, 8: 4000000, 9: 6000000, 10: 8500000, 11: 12500000, 12: 17500000, 13: 30000000}
-    vars_map7 = ['c1000bdit']
-
-    # Mapping 8: Q320
-    map8 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 6000000, 12: 8500000, 13: 12500000, 14: 17500000, 15: 30000000}
-    vars_map8 = ['c2000fit']
-
-    # Mapping 9: Q335, Q338
-    map9 = {1: 5000, 2: 20000, 3: 40000, 4: 60000, 5: 85000, 6: 200000, 7: 400000, 8: 750000, 9: 3000000, 10: 7500000, 11: 12500000, 12: 17500000, 13: 30000000}
-    vars_map9 = ['c2013it', 'c2016it']
-
-    # Mapping 10: Q344, Q347, Q361
-    map10 = {1: 50000, 2: 150000, 3: 350000, 4: 650000, 5: 900000, 6: 1250000, 7: 1750000, 8: 3500000, 9: 6500000, 10: 9000000, 11: 15000000}
-    vars_map10 = ['c2027dit', 'c2032it', 'c2064it']
-
-    # Mapping 11: Q355
-    map11 = {1: 500, 2: 2000, 3: 4000, 4: 6500, 5: 9000, 6: 12500, 7: 17500, 8: 25000, 9: 40000, 10: 75000}
-    vars_map11 = ['c2045it']
-
-    # Mapping 12: Q364, Q366
-    map12 = {1: 25000, 2: 75000, 3: 150000, 4: 250000, 5: 400000, 6: 650000, 7: 900000, 8: 1250000, 9: 1750000, 10: 3500000, 11: 7500000}
-    vars_map12 = ['c3002it', 'c3002ait']
-
-    # Mapping 13: Q468, Q470, Q616, Q620
-    map13 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 7500000}
-    vars_map13 = ['c3024it', 'c3025it', 'd4111it', 'd6116it']
-
-    # Mapping 14: Q534, Q809, Q811, Q813, Q815, Q817, Q538, Q728, Q744
-    map14 = {1: 1000, 2: 3500, 3: 7500, 4: 15000, 5: 35000, 6: 75000, 7: 125000, 8: 175000, 9: 250000, 10: 400000, 11: 750000}
-    vars_map14 = ['c8002ait', 'g1017it', 'g1018it', 'g1019it', 'g1019ait', 'g1020it', 'c8005ait', 'f2006it', 'f4011it']
-
-    # Mapping 15: Q625
-    map15 = {1: 10000, 2: 35000, 3: 75000, 4: 150000, 5: 350000, 6: 750000, 7: 1500000, 8: 3500000, 9: 7500000, 10: 15000000, 11: 30000000}
-    vars_map15 = ['d8106it']
-
-    # Mapping 16: Q706
-    map16 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 7500000}
-    vars_map16 = ['e3005cit']
-
-    # Mapping 17: Q713
-    map17 = {1: 25, 2: 75, 3: 125, 4: 225, 5: 400, 6: 650, 7: 1150, 8: 2250, 9: 4000, 10: 7500, 11: 15000, 12: 25000, 13: 40000, 14: 75000}
-    vars_map17 = ['f1005it']
-
-    # Mapping 18: Q737
-    map18 = {1: 100, 2: 250, 3: 400, # Option 4 (500以下) might be missing in some waves
-             5: 750, 6: 1500, 7: 2500, 8: 4000, 9: 6500, 10: 11500, 11: 17500, 12: 30000}
-    vars_map18 = ['f4005it']
-
-    # Mapping 19: Q740
-    map19 = {1: 500, 2: 2000, 3: 4000, # Option 4 (5千以下) might be missing
-             5: 7500, 6: 15000, 7: 35000, 8: 75000, 9: 125000, 10: 175000, 11: 250000, 12: 400000, 13: 750000, 14: 1500000}
-    vars_map19 = ['f4008it']
-
-    # Mapping 20: Q902
-    map20 = {1: 250, 2: 750, 3: 1500, 4: 3500, 5: 7500, 6: 15000, 7: 30000}
-    vars_map20 = ['h3351it']
-
-    # Mapping 21: Q906, Q909
-    map21 = {1: 250, 2: 750, 3: 2000, 4: 4000, 5: 7500, 6: 15000, 7: 35000, 8: 75000}
-    vars_map21 = ['h3354it', 'h3356it']
-
-    # Mapping 22: Q918, Q920, Q922
-    map22 = {1: 50, 2: 300, 3: 750, 4: 3000, 5: 7500, 6: 30000, 7: 75000}
-    vars_map22 = ['h3367it', 'h3368it', 'h3369it']
-
-    # Mapping 23: Q826
-    map23 = {1: 150, 2: 450, 3: 800, 4: 1250, 5: 2250, 6: 4500, 7: 8000, 8: 15000, 9: 35000, 10: 75000, 11: 150000}
-    vars_map23 = ['g1024it']
-
-    # --- Apply Mapping ---
-    if base_var_name in vars_map1: return map1.get(interval_code, np.nan)
-    if base_var_name in vars_map2: return map2.get(interval_code, np.nan)
-    if base_var_name in vars_map3: return map3.get(interval_code, np.nan)
-    if base_var_name in vars_map4: return map4.get(interval_code, np.nan)
-    if base_var_name in vars_map5: return map5.get(interval_code, np.nan)
-    if base_var_name in vars_map6: return map6.get(interval_code, np.nan) # Note: Unit is sqm
-    if base_var_name in vars_map7: return map7.get(interval_code, np.nan)
-    if base_var_name in vars_map8: return map8.get(interval_code, np.nan)
-    if base_var_name in vars_map9: return map9.get(interval_code, np.nan)
-    if base_var_name in vars_map10: return map10.get(interval_code, np.nan)
-    if base_var_name in vars_map11: return map11.get(interval_code, np.nan)
-    if base_var_name in vars_map12: return map12.get(interval_code, np.nan)
-    if base_var_name in vars_map13: return map13.get(interval_code, np.nan)
-    if base_var_name in vars_map14: return map14.get(interval_code, np.nan)
-    if base_var_name in vars_map15: return map15.get(interval_code, np.nan)
-    if base_var_name in vars_map16: return map16.get(interval_code, np.nan)
-    if base_var_name in vars_map17: return map17.get(interval_code, np.nan)
-    if base_var_name in vars_map18: return map18.get(interval_code, np.nan)
-    if base_var_name in vars_map19: return map19.get(interval_code, np.nan)
-    if base_var_name in vars_map20: return map20.get(interval_code, np.nan)
-    if base_var_name in vars_map21: return map21.get(interval_code, np.nan)
-    if base_var_name in vars_map22: return map22.get(interval_code, np.nan)
-    if base_var_name in vars_map23: return map23.get(interval_code, np.nan)
-
-    # Fallback or warning if no mapping found
-    # print(f"警告: 未找到变量 '{var_name}' (基础变量 '{base_var_name}') 的特定中点映射。返回 NaN。") # Keep this commented unless debugging
-    return np.nan
+# Head info is unique per hhid, so this is an indexed left lookup that keeps hh_df's rows and order
+hh_df = hh_df.join(head_info_to_merge, on='hhid')
+
+# Individual-level frames are no longer needed; release them before the wide household passes
+del ind_df, heads_df, head_info_to_merge
+gc.collect()
+
+
+# --- Interval Midpoint Mappings (Corrected based on Questionnaire) ---
+# 根据 CHFS 2017 问卷定义的区间编码中点值（单位：元 或 平方米）。
+# 对“X以上”的开放区间，使用下限的1.5倍作为估计。
+# Note: Upper bound estimation uses 1.5 * lower bound
+
+# Mapping 1: Q158, Q172, Q181, Q184, Q187, Q565, Q567, Q614, Q587, Q589, Q618, Q623, Q627, Q631, Q649, Q460
+map1 = {1: 5000, 2: 20000, 3: 40000, 4: 60000, 5: 85000, 6: 200000, 7: 400000, 8: 750000, 9: 3000000, 10: 7500000, 11: 15000000}
+vars_map1 = ['b2003ait', 'b2050it', 'b2059it', 'b2063it', 'b2080it', 'd3109it', 'd3110it', 'd4103it',
+             'd5107it', 'd5108it', 'd6100ait', 'd8104it', 'd9103it', 'd9110ait', 'k2102cit', 'c3019ait']
+
+# Mapping 2: Q162, Q175 (Same as Map 1)
+map2 = map1
+vars_map2 = ['b2003bit', 'b2052it']
+
+# Mapping 3: Q164, Q178, Q120, Q579, Q170, Q213, Q215, Q217, Q219, Q238, Q240, Q242, Q244, Q261, Q452, Q463, Q466, Q481, Q483, Q513, Q515, Q541, Q546, Q549, Q560, Q599, Q607, Q663, Q670, Q698, Q678, Q851, Q351
+map3 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 7500000}
+vars_map3 = ['b2003eit', 'b2055it', 'a3136it', 'd3117it', 'b2046it', 'b3004bit', 'b3005bit', 'b3005it', 'b3006ait',
+             'b3030dit', 'b3030eit', 'b3031ait', 'b3045cit', 'b3056ait', 'c3017cait', 'c3019cit', 'c3019eit',
+             'c7052bit', 'c7060it', 'c7061it', 'c7062it', 'c8007it', 'd1105it', 'd2104it', 'd3103it', 'd7106hit',
+             'd7110ait', 'e1006it', 'e1022it', 'e3003cit', 'e4003it', 'h2004it', 'c2035ait']
+
+# Mapping 4: Q190, Q122, Q124, Q126, Q205, Q595, Q601, Q609, Q629, Q637, Q633, Q646, Q660, Q716, Q722
+map4 = {1: 2500, 2: 7500, 3: 15000, 4: 35000, 5: 75000, 6: 125000, 7: 175000, 8: 250000, 9: 400000, 10: 750000, 11: 1500000}
+vars_map4 = ['b2093it', 'a3136ait', 'a3136bit', 'a3137it', 'b2110it', 'd5109it', 'd7106jit', 'd7112it',
+             'd9105it', 'd9108it', 'd9110bit', 'k1101it', 'k2208it', 'f1010it', 'f1031it']
+
+# Mapping 5: Q230
+map5 = {1: 500, 2: 1500, 3: 3500, 4: 7500, 5: 15000, 6: 35000, 7: 75000, 8: 150000}
+vars_map5 = ['b3008fit']
+
+# Mapping 6: Q282 (Unit: sqm)
+map6 = {1: 25, 2: 60.5, 3: 80.5, 4: 95.5, 5: 110.5, 6: 132, 7: 172, 8: 300}
+vars_map6 = ['c1000bbit']
+
+# Mapping 7: Q284
+map7 = {1: 50000, 2: 200000, 3: 400000, 4: 600000, 5: 850000, 6: 1250000, 7: 2250000, 8: 4000000, 9: 6000000, 10: 8500000, 11: 12500000, 12: 17500000, 13: 30000000}
+vars_map7 = ['c1000bdit']
+
+# Mapping 8: Q320
+map8 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 6000000, 12: 8500000, 13: 12500000, 14: 17500000, 15: 30000000}
+vars_map8 = ['c2000fit']
+
+# Mapping 9: Q335, Q338
+map9 = {1: 5000, 2: 20000, 3: 40000, 4: 60000, 5: 85000, 6: 200000, 7: 400000, 8: 750000, 9: 3000000, 10: 7500000, 11: 12500000, 12: 17500000, 13: 30000000}
+vars_map9 = ['c2013it', 'c2016it']
+
+# Mapping 10: Q344, Q347, Q361
+map10 = {1: 50000, 2: 150000, 3: 350000, 4: 650000, 5: 900000, 6: 1250000, 7: 1750000, 8: 3500000, 9: 6500000, 10: 9000000, 11: 15000000}
+vars_map10 = ['c2027dit', 'c2032it', 'c2064it']
+
+# Mapping 11: Q355
+map11 = {1: 500, 2: 2000, 3: 4000, 4: 6500, 5: 9000, 6: 12500, 7: 17500, 8: 25000, 9: 40000, 10: 75000}
+vars_map11 = ['c2045it']
+
+# Mapping 12: Q364, Q366
+map12 = {1: 25000, 2: 75000, 3: 150000, 4: 250000, 5: 400000, 6: 650000, 7: 900000, 8: 1250000, 9: 1750000, 10: 3500000, 11: 7500000}
+vars_map12 = ['c3002it', 'c3002ait']
+
+# Mapping 13: Q468, Q470, Q616, Q620
+map13 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 7500000}
+vars_map13 = ['c3024it', 'c3025it', 'd4111it', 'd6116it']
+
+# Mapping 14: Q534, Q809, Q811, Q813, Q815, Q817, Q538, Q728, Q744
+map14 = {1: 1000, 2: 3500, 3: 7500, 4: 15000, 5: 35000, 6: 75000, 7: 125000, 8: 175000, 9: 250000, 10: 400000, 11: 750000}
+vars_map14 = ['c8002ait', 'g1017it', 'g1018it', 'g1019it', 'g1019ait', 'g1020it', 'c8005ait', 'f2006it', 'f4011it']
+
+# Mapping 15: Q625
+map15 = {1: 10000, 2: 35000, 3: 75000, 4: 150000, 5: 350000, 6: 750000, 7: 1500000, 8: 3500000, 9: 7500000, 10: 15000000, 11: 30000000}
+vars_map15 = ['d8106it']
+
+# Mapping 16: Q706
+map16 = {1: 5000, 2: 15000, 3: 35000, 4: 75000, 5: 150000, 6: 250000, 7: 400000, 8: 750000, 9: 1500000, 10: 3500000, 11: 7500000}
+vars_map16 = ['e3005cit']
+
+# Mapping 17: Q713
+map17 = {1: 25, 2: 75, 3: 125, 4: 225, 5: 400, 6: 650, 7: 1150, 8: 2250, 9: 4000, 10: 7500, 11: 15000, 12: 25000, 13: 40000, 14: 75000}
+vars_map17 = ['f1005it']
+
+# Mapping 18: Q737
+map18 = {1: 100, 2: 250, 3: 400, # Option 4 (500以下) might be missing in some waves
+         5: 750, 6: 1500, 7: 2500, 8: 4000, 9: 6500, 10: 11500, 11: 17500, 12: 30000}
+vars_map18 = ['f4005it']
+
+# Mapping 19: Q740
+map19 = {1: 500, 2: 2000, 3: 4000, # Option 4 (5千以下) might be missing
+         5: 7500, 6: 15000, 7: 35000, 8: 75000, 9: 125000, 10: 175000, 11: 250000, 12: 400000, 13: 750000, 14: 1500000}
+vars_map19 = ['f4008it']
+
+# Mapping 20: Q902
+map20 = {1: 250, 2: 750, 3: 1500, 4: 3500, 5: 7500, 6: 15000, 7: 30000}
+vars_map20 = ['h3351it']
+
+# Mapping 21: Q906, Q909
+map21 = {1: 250, 2: 750, 3: 2000, 4: 4000, 5: 7500, 6: 15000, 7: 35000, 8: 75000}
+vars_map21 = ['h3354it', 'h3356it']
+
+# Mapping 22: Q918, Q920, Q922
+map22 = {1: 50, 2: 300, 3: 750, 4: 3000, 5: 7500, 6: 30000, 7: 75000}
+vars_map22 = ['h3367it', 'h3368it', 'h3369it']
+
+# Mapping 23: Q826
+map23 = {1: 150, 2: 450, 3: 800, 4: 1250, 5: 2250, 6: 4500, 7: 8000, 8: 15000, 9: 35000, 10: 75000, 11: 150000}
+vars_map23 = ['g1024it']
+
+# Lookup from base interval variable name to its midpoint mapping, built once at import.
+# Earlier lists take precedence, matching the original if-chain order.
+VAR_TO_MAP = {}
+for _vars, _map in [(vars_map1, map1), (vars_map2, map2), (vars_map3, map3), (vars_map4, map4),
+                    (vars_map5, map5), (vars_map6, map6), (vars_map7, map7), (vars_map8, map8),
+                    (vars_map9, map9), (vars_map10, map10), (vars_map11, map11), (vars_map12, map12),
+                    (vars_map13, map13), (vars_map14, map14), (vars_map15, map15), (vars_map16, map16),
+                    (vars_map17, map17), (vars_map18, map18), (vars_map19, map19), (vars_map20, map20),
+                    (vars_map21, map21), (vars_map22, map22), (vars_map23, map23)]:
+    for _v in _vars:
+        VAR_TO_MAP.setdefault(_v, _map)
+
+
+def _base(var_name):
+    """去掉区间变量名末尾的 _1, _2 等后缀 (e.g., 'c2016it_1' -> 'c2016it')。"""
+    return re.sub(r'_\d+$', '', var_name)
 
 
 # --- Data Cleaning and Calculation ---
@@ -289,138 +400,152 @@ print("注意：区间变量将使用基于 CHFS 2017 问卷估计的中点值
 all_vars_needed = list(set(all_debt_exact_vars + all_debt_interval_vars +
                            all_asset_exact_vars + all_asset_interval_vars +
                            [vehicle_in_business_col, vehicle_in_business_col_it]))
-missing_cols_count = 0
-for col in all_vars_needed:
-    if col not in hh_df.columns:
-        hh_df[col] = np.nan
-        missing_cols_count += 1
-if missing_cols_count > 0: print(f"警告：共创建了 {missing_cols_count} 个缺失的列作为 NaN。")
-
-# --- Coalesce Exact and Interval Values ---
-print("正在合并精确值和区间中点值...")
-coalesced_debt_vars = []
-for i in range(len(all_debt_exact_vars)):
-    exact = all_debt_exact_vars[i]
-    interval = all_debt_interval_vars[i] if i < len(all_debt_interval_vars) else None
-    val_col = f"{exact}_val"
-
-    if exact not in hh_df:
-        hh_df[val_col] = np.nan
-        continue
-
-    if interval and interval in hh_df:
-        midpoint_col = hh_df[interval].apply(lambda x: get_midpoint(x, var_name=interval))
-        hh_df[val_col] = hh_df[exact].combine_first(midpoint_col)
-    else:
-         hh_df[val_col] = hh_df[exact]
-
-    coalesced_debt_vars.append(val_col)
+missing_cols = [col for col in all_vars_needed if col not in hh_df.columns]
+missing_cols_count = len(missing_cols)
+if missing_cols_count > 0:
+    hh_df = pd.concat([hh_df, pd.DataFrame(np.nan, index=hh_df.index, columns=missing_cols)], axis=1)
+    print(f"警告：共创建了 {missing_cols_count} 个缺失的列作为 NaN。")
 
 
-coalesced_asset_vars = []
-for i in range(len(all_asset_exact_vars)):
-     exact = all_asset_exact_vars[i]
-     interval = all_asset_interval_vars[i] if i < len(all_asset_interval_vars) else None
-     val_col = f"{exact}_val"
+# --- Coalesce Exact and Interval Values ---
+def coalesce(df, exact, interval):
+    """
+    精确值优先；精确值缺失时使用区间编码对应的中点值。
 
-     if exact not in hh_df:
-         hh_df[val_col] = np.nan
-         continue
+    Args:
+        df (pd.DataFrame): 包含精确值列和区间列的数据。
+        exact (str): 精确值变量名。
+        interval (str or None): 对应的区间变量名；为 None 时直接返回精确值。
 
-     if interval and interval in hh_df:
-         midpoint_col = hh_df[interval].apply(lambda x: get_midpoint(x, var_name=interval))
-         hh_df[val_col] = hh_df[exact].combine_first(midpoint_col)
-     else:
-         hh_df[val_col] = hh_df[exact]
+    Returns:
+        np.ndarray: 合并后的数值 (float64)。
+    """
+    exact_arr = df[exact].to_numpy(dtype=np.float64)
+    if interval is None:
+        return exact_arr
+    midpoint_arr = df[interval].map(VAR_TO_MAP.get(_base(interval), {})).to_numpy(dtype=np.float64)
+    return np.where(np.isnan(exact_arr), midpoint_arr, exact_arr)
 
-     coalesced_asset_vars.append(val_col)
 
-# Handle vehicle adjustment variable separately
+print("正在合并精确值和区间中点值...")
+# All listed columns exist at this point (missing ones were created as NaN above).
+# Exact and interval variables are paired by position; trailing exact variables have no interval.
 vehicle_adj_val_col = f"{vehicle_in_business_col}_val"
-if vehicle_in_business_col in hh_df and vehicle_in_business_col_it in hh_df:
-    midpoint_veh_adj = hh_df[vehicle_in_business_col_it].apply(lambda x: get_midpoint(x, var_name=vehicle_in_business_col_it))
-    hh_df[vehicle_adj_val_col] = hh_df[vehicle_in_business_col].combine_first(midpoint_veh_adj)
-elif vehicle_in_business_col in hh_df:
-     hh_df[vehicle_adj_val_col] = hh_df[vehicle_in_business_col]
-else:
-     hh_df[vehicle_adj_val_col] = 0
+val_specs = [] # (coalesced column, exact variable, interval variable or None)
+for exact_vars, interval_vars in [(all_debt_exact_vars, all_debt_interval_vars),
+                                  (all_asset_exact_vars, all_asset_interval_vars)]:
+    for i, exact in enumerate(exact_vars):
+        interval = interval_vars[i] if i < len(interval_vars) else None
+        val_specs.append((f"{exact}_val", exact, interval))
+# Vehicle adjustment variable (vehicles used in business, subtracted from assets below)
+val_specs.append((vehicle_adj_val_col, vehicle_in_business_col, vehicle_in_business_col_it))
+coalesced_debt_vars = [f"{exact}_val" for exact in all_debt_exact_vars]
+coalesced_asset_vars = [f"{exact}_val" for exact in all_asset_exact_vars]
 
 # --- Calculate Totals using Coalesced Values ---
-valid_coalesced_debt_vars = [col for col in coalesced_debt_vars if col in hh_df.columns]
-valid_coalesced_asset_vars = [col for col in coalesced_asset_vars if col in hh_df.columns]
-
-hh_df['total_debt'] = hh_df[valid_coalesced_debt_vars].fillna(0).sum(axis=1)
-hh_df['total_assets_raw'] = hh_df[valid_coalesced_asset_vars].fillna(0).sum(axis=1)
+value_cols = pd.DataFrame({name: coalesce(hh_df, exact, interval) for name, exact, interval in val_specs}, index=hh_df.index)
+# np.nansum treats NaN as 0, fusing the fill and the row sum into one pass over each block
+value_cols['total_debt'] = np.nansum(value_cols[coalesced_debt_vars].to_numpy(dtype=np.float64), axis=1)
+value_cols['total_assets_raw'] = np.nansum(value_cols[coalesced_asset_vars].to_numpy(dtype=np.float64), axis=1)
+hh_df = pd.concat([hh_df, value_cols], axis=1)
 
-vehicle_adjustment = hh_df[vehicle_adj_val_col].fillna(0) if vehicle_adj_val_col in hh_df else 0
+vehicle_adjustment = hh_df[vehicle_adj_val_col].fillna(0)
 hh_df['total_assets'] = hh_df['total_assets_raw'] - vehicle_adjustment
-hh_df['total_assets'] = hh_df['total_assets'].apply(lambda x: max(x, 0))
+hh_df['total_assets'] = np.maximum(hh_df['total_assets'].to_numpy(), 0.0)
 print("总负债和总资产计算完成。")
 
 # --- Calculate Debt Ratio ---
 print("正在计算负债率...")
 epsilon = 1e-9 # Use a smaller epsilon
-hh_df['debt_ratio'] = hh_df['total_debt'] / (hh_df['total_assets'] + epsilon)
-hh_df.loc[(hh_df['total_debt'] == 0) & (hh_df['total_assets'] == 0), 'debt_ratio'] = 0
-hh_df.loc[(hh_df['total_debt'] > 0) & (hh_df['total_assets'] == 0), 'debt_ratio'] = np.nan # Assign NaN for infinite ratio
+total_debt_arr = hh_df['total_debt'].to_numpy()
+total_assets_arr = hh_df['total_assets'].to_numpy()
+zero_assets = total_assets_arr == 0
+# 0/0 -> 0; positive debt with zero assets -> NaN (infinite ratio); otherwise debt / (assets + epsilon)
+hh_df['debt_ratio'] = np.where(zero_assets & (total_debt_arr == 0), 0.0,
+                               np.where(zero_assets & (total_debt_arr > 0), np.nan,
+                                        total_debt_arr / (total_assets_arr + epsilon)))
 print("负债率计算完成。")
 
 
 # --- Winsorize Debt Ratio ---
-debt_ratio_clean = hh_df['debt_ratio'].replace([np.inf, -np.inf], np.nan).dropna()
-if not debt_ratio_clean.empty:
-    winsorized_values = winsorize(debt_ratio_clean, limits=[0.01, 0.01])
-    hh_df['debt_ratio_winsorized'] = pd.Series(winsorized_values, index=debt_ratio_clean.index)
+def winsorize_and_log(ratio, lower, upper, log_constant):
+    """
+    一次遍历完成 winsorize（裁剪到 [lower, upper]）与对数变换 log(x + log_constant)。
+
+    Args:
+        ratio (np.ndarray): 负债率；非有限值（NaN/inf）不参与处理，结果为 NaN。
+        lower (float): 下限。
+        upper (float): 上限。
+        log_constant (float): 取对数前加上的小常数。
+
+    Returns:
+        tuple: (winsorized, log_winsorized)；x + log_constant <= 0 时对数结果为 NaN。
+    """
+    winsorized = np.where(np.isfinite(ratio), np.clip(ratio, lower, upper), np.nan)
+    log_input = winsorized + log_constant
+    return winsorized, np.log(np.where(log_input > 0, log_input, np.nan))
+
+
+small_constant_dv = 0.001 # Added before taking the log of the winsorized ratio
+debt_ratio_arr = hh_df['debt_ratio'].to_numpy(dtype=np.float64)
+finite_ratio = np.isfinite(debt_ratio_arr)
+if finite_ratio.any():
+    debt_ratio_clean = debt_ratio_arr[finite_ratio]
+    # Clip at the same order statistics scipy.stats.mstats.winsorize(limits=[0.01, 0.01]) uses,
+    # found with a single partition instead of a full sort
+    n_clean = len(debt_ratio_clean)
+    low_idx = int(0.01 * n_clean)
+    up_idx = n_clean - int(0.01 * n_clean) - 1
+    lower, upper = np.partition(debt_ratio_clean, [low_idx, up_idx])[[low_idx, up_idx]]
+    debt_ratio_winsorized, log_debt_ratio_winsorized = winsorize_and_log(debt_ratio_arr, lower, upper, small_constant_dv)
+    hh_df['debt_ratio_winsorized'] = debt_ratio_winsorized
     print(f"已对 debt_ratio 进行 Winsorize 处理 (1% 上下限)。新列为 'debt_ratio_winsorized'。")
 else:
     print("警告：debt_ratio 列清理后为空，无法进行 Winsorize 处理。")
     hh_df['debt_ratio_winsorized'] = np.nan
+    log_debt_ratio_winsorized = np.nan
 
 
 # --- Prepare Control Variables ---
 print("正在准备控制变量...")
+# Derived controls are collected here and attached to hh_df in a single concat;
+# indicator variables are nullable Int8 (1/0, <NA> where the source is missing)
+control_cols = {}
 if 'head_sex' in hh_df.columns:
-    hh_df['head_is_male'] = np.where(hh_df['head_sex'] == 1, 1, 0)
-    hh_df.loc[hh_df['head_sex'].isna(), 'head_is_male'] = np.nan
+    control_cols['head_is_male'] = hh_df['head_sex'].eq(1).astype('Int8').mask(hh_df['head_sex'].isna())
 else:
-    hh_df['head_is_male'] = np.nan
+    control_cols['head_is_male'] = np.nan
     print("警告：'head_sex' 列缺失，无法创建 'head_is_male'。")
 
 if 'head_marital' in hh_df.columns:
-    hh_df['head_is_married'] = np.where(hh_df['head_marital'].isin([2, 3, 7]), 1, 0)
-    hh_df.loc[hh_df['head_marital'].isna(), 'head_is_married'] = np.nan
+    control_cols['head_is_married'] = hh_df['head_marital'].isin([2, 3, 7]).astype('Int8').mask(hh_df['head_marital'].isna())
 else:
-     hh_df['head_is_married'] = np.nan
+     control_cols['head_is_married'] = np.nan
      print("警告：'head_marital' 列缺失，无法创建 'head_is_married'。")
 
 if 'b2000b' in hh_df.columns:
-    hh_df['has_business'] = np.where(hh_df['b2000b'] == 1, 1, 0)
-    hh_df.loc[hh_df['b2000b'].isna(), 'has_business'] = np.nan
+    control_cols['has_business'] = hh_df['b2000b'].eq(1).astype('Int8').mask(hh_df['b2000b'].isna())
 else:
-    hh_df['has_business'] = np.nan
+    control_cols['has_business'] = np.nan
     print("警告：'b2000b' 列缺失，无法创建 'has_business'。")
 
 if 'c2002' in hh_df.columns:
     # Fill NaN with 0 for num_houses, assuming NaN means no houses owned or info missing
-    hh_df['num_houses'] = hh_df['c2002'].fillna(0)
+    control_cols['num_houses'] = hh_df['c2002'].fillna(0)
 else:
-    hh_df['num_houses'] = 0 # Assume 0 if column missing
+    control_cols['num_houses'] = 0 # Assume 0 if column missing
     print("警告：'c2002' 列缺失，'num_houses' 设为 0。")
 
 # --- Log Transform Total Assets ---
 print("正在对 total_assets 进行对数变换...")
-hh_df['log_total_assets'] = np.log(hh_df['total_assets'] + 1) # Add 1 to handle zero assets
+control_cols['log_total_assets'] = np.log(hh_df['total_assets'] + 1) # Add 1 to handle zero assets
 
 # --- Create Log Transformed Dependent Variable (for robustness check) ---
 print("正在创建对数变换后的负债率（用于稳健性检验）...")
-small_constant_dv = 0.001
-if 'debt_ratio_winsorized' in hh_df.columns:
-    # Ensure the input to log is positive
-    log_input = hh_df['debt_ratio_winsorized'] + small_constant_dv
-    hh_df['log_debt_ratio_winsorized'] = np.log(log_input.where(log_input > 0)) # Apply log only where input > 0
-else:
-    hh_df['log_debt_ratio_winsorized'] = np.nan
-    print("警告：'debt_ratio_winsorized' 列缺失，无法创建对数变换后的负债率。")
+# Computed in the same pass as the winsorization above; log is applied only where the input is > 0
+control_cols['log_debt_ratio_winsorized'] = log_debt_ratio_winsorized
+
+hh_df = pd.concat([hh_df, pd.DataFrame(control_cols, index=hh_df.index)], axis=1)
 
 
 # --- Select Final Columns for Analysis ---
@@ -476,8 +601,9 @@ reg_independent_vars = ['head_siblings'] + head_controls + hh_controls
 reg_independent_vars = [v for v in reg_independent_vars if v in final_df.columns] # Keep only existing columns
 
 # Model 1 (Original DV)
+# dropna already returns a new frame and the model frames are only read from here on, so no .copy()
 key_reg_vars_model1 = ['debt_ratio_winsorized'] + reg_independent_vars
-final_df_model1 = final_df.dropna(subset=[col for col in key_reg_vars_model1 if col in final_df.columns]).copy()
+final_df_model1 = final_df.dropna(subset=[col for col in key_reg_vars_model1 if col in final_df.columns])
 rows_after_model1 = len(final_df_model1)
 print(f"模型1 (DV=debt_ratio_winsorized): 清理后用于回归的数据集包含 {rows_after_model1} 个家庭 (原始 {len(final_df)}).")
 if len(final_df) > 0:
@@ -485,45 +611,263 @@ if len(final_df) > 0:
 
 # Model 2 (Log DV)
 key_reg_vars_model2 = ['log_debt_ratio_winsorized'] + reg_independent_vars
-final_df_model2 = final_df.dropna(subset=[col for col in key_reg_vars_model2 if col in final_df.columns]).copy()
+final_df_model2 = final_df.dropna(subset=[col for col in key_reg_vars_model2 if col in final_df.columns])
 if 'log_debt_ratio_winsorized' in final_df_model2.columns:
     final_df_model2 = final_df_model2[np.isfinite(final_df_model2['log_debt_ratio_winsorized'])]
 rows_after_model2 = len(final_df_model2)
 print(f"模型2 (DV=log_debt_ratio_winsorized): 清理后用于回归的数据集包含 {rows_after_model2} 个家庭。")
 
+# Regressor columns per sample, shared by all models that use that sample
+cols_m1 = [col for col in reg_independent_vars if col in final_df_model1.columns] # Models 1, 3, 5
+cols_m2 = [col for col in reg_independent_vars if col in final_df_model2.columns] # Models 2, 4
+
+
+# --- Function to Build the [const | X] Design Matrix ---
+def build_design_matrix(df, cols):
+    """
+    预先分配 (n, p+1) 的 Fortran 顺序矩阵，第 0 列填 1，其余各列直接从 df 的列写入，
+    不经过 df[cols] 或 sm.add_constant 生成的中间 DataFrame。
+
+    Args:
+        df (pd.DataFrame): 回归样本。
+        cols (list): 自变量列名（不含常数项）。
+
+    Returns:
+        np.ndarray: 设计矩阵 (n, p+1)，float64，列主序（便于 LAPACK 最小二乘）。
+    """
+    X_const = np.empty((len(df), len(cols) + 1), dtype=np.float64, order='F')
+    X_const[:, 0] = 1.0
+    for j, col in enumerate(cols, start=1):
+        X_const[:, j] = df[col].to_numpy(dtype=np.float64)
+    return X_const
+
+
+# --- Function to Compute the Gram Matrix of a Design Matrix (cached across models) ---
+gram_cache = {}
+
+def get_gram(df, cols, X_const):
+    """
+    返回设计矩阵 [const | X] 的 X^T X。按列集缓存：若列相同且行索引完全一致，直接复用，
+    否则重新计算一次矩阵乘法。
+
+    Args:
+        df (pd.DataFrame): 回归样本（仅用其行索引判断是否可复用）。
+        cols (list): 自变量列名（不含常数项）。
+        X_const (np.ndarray): 对应的设计矩阵 (n, p+1)，第一列为常数项。
+
+    Returns:
+        np.ndarray: X^T X, 形状 (p+1, p+1)。
+    """
+    cached = gram_cache.get(tuple(cols))
+    if cached is not None and cached[0].equals(df.index):
+        return cached[1]
+    XtX = X_const.T @ X_const
+    gram_cache[tuple(cols)] = (df.index, XtX)
+    return XtX
+
 
 # --- Function to Calculate VIF ---
-def calculate_vif(df, cols):
-    x_vif = df[cols]
-    x_vif = sm.add_constant(x_vif, has_constant='add') # Add constant for VIF calculation
-    vif_data = pd.DataFrame()
-    vif_data["feature"] = x_vif.columns
-    vif_data["VIF"] = [variance_inflation_factor(x_vif.values, i) for i in range(x_vif.shape[1])]
-    # Exclude the constant's VIF for interpretation
-    return vif_data[vif_data["feature"] != 'const'].sort_values('VIF', ascending=False)
+def calculate_vif(XtX, cols):
+    # VIF_i = 1 / (1 - R_i^2) of regressing feature i on the others plus a constant, which equals
+    # the i-th diagonal element of the inverse correlation matrix; pinv keeps it defined under
+    # perfect collinearity. The correlation matrix comes straight from the [const | X] Gram matrix.
+    n = XtX[0, 0]
+    col_sums = XtX[0, 1:]
+    cov = XtX[1:, 1:] - np.outer(col_sums, col_sums) / n
+    var = np.diag(cov)
+    # A constant column (e.g. has_business all 0 in a subsample) has no defined VIF (NaN, as
+    # variance_inflation_factor gives) and is left out of the inversion so the other VIFs stay defined.
+    # The tolerance absorbs rounding in XtX, whose diagonal is the column's raw sum of squares.
+    varying = var > 1e-10 * np.diag(XtX)[1:]
+    sd = np.sqrt(var[varying])
+    corr = cov[np.ix_(varying, varying)] / np.outer(sd, sd)
+    vif = np.full(len(cols), np.nan)
+    if varying.any():
+        vif[varying] = np.diag(np.linalg.pinv(np.atleast_2d(corr)))
+    # Index 1..p as before (position 0 was the constant)
+    vif_data = pd.DataFrame({"feature": cols, "VIF": vif}, index=range(1, len(cols) + 1))
+    return vif_data.sort_values('VIF', ascending=False)
+
+
+# --- Function to Standardize Ridge Features (fitted scalers are shared between models) ---
+scaler_cache = {}
+
+def get_scaled(df, cols, X_const=None):
+    """
+    返回 df[cols] 标准化后的矩阵。已拟合的 StandardScaler 按列集缓存：
+    若列相同且行索引完全一致（如模型 1 与模型 2 的样本相同），直接复用已标准化的矩阵，不再重新拟合。
+
+    Args:
+        df (pd.DataFrame): 回归样本。
+        cols (list): 自变量列名。
+        X_const (np.ndarray, optional): 已构建的 [const | X] 设计矩阵；提供时从中复制自变量，不再读取 df。
+
+    Returns:
+        np.ndarray: 标准化后的自变量矩阵 (n, p)，float32。
+    """
+    cached = scaler_cache.get(tuple(cols))
+    if cached is not None and cached[0].equals(df.index):
+        return cached[2]
+    if X_const is not None:
+        X = np.array(X_const[:, 1:], dtype=np.float64, order='C') # Always a copy: scaled in place below
+    else:
+        X = np.ascontiguousarray(df[cols].to_numpy(dtype=np.float64))
+    scaler = StandardScaler(copy=False) # X is a fresh array, so scale it in place
+    # Means/stds are computed in float64; the standardized values only need float32 precision
+    X_scaled = scaler.fit_transform(X).astype(np.float32)
+    scaler_cache[tuple(cols)] = (df.index, scaler, X_scaled)
+    return X_scaled
+
+
+# --- Function for Ridge Regression with Leave-One-Out Alpha Selection ---
+LOO_SAMPLE_MIN_ROWS = 50_000 # Above this many rows, the alpha search scores LOO errors on a row sample
+LOO_SAMPLE_ROWS = 2048
+
+def ridge_cv_svd(X, y, alphas, refine=False):
+    """
+    与 RidgeCV(alphas) 相同的岭回归（带截距，按留一交叉验证均方误差选择 alpha），
+    但只对中心化后的 X 做一次分解，所有 alpha 的拟合值与留一残差都由同一分解得到：
+    通常 p 远小于 n，因此对 p×p 的 X^T X 做特征分解；样本数少于变量数时改用对偶形式，分解 n×n 的 X X^T。
+    y 可以是 (n, t) 的多个因变量：共用同一分解，每列各自选择 alpha。
+    样本数超过 LOO_SAMPLE_MIN_ROWS 时，alpha 搜索只在固定随机抽取的 LOO_SAMPLE_ROWS 行上计算留一残差，
+    选定 alpha 后再用全部样本计算系数与留一均方误差。
+
+    Args:
+        X (np.ndarray): 自变量矩阵 (n, p)。
+        y (np.ndarray): 因变量 (n,) 或 (n, t)。
+        alphas (array-like): 候选正则化强度（按升序排列）。
+        refine (bool): 为 True 时将 alphas 视为对数等距的粗网格：若最优值落在网格边缘则向外扩展，
+                       再在最优值两侧逐次折半步长细化搜索，直到步长小于 0.2 个数量级。
+
+    Returns:
+        tuple: (best_alpha, coef, intercept, best_mse, y_hat)，best_mse 为最佳 alpha 下的留一交叉验证均方误差，
+               y_hat 为最佳 alpha 下的样本内拟合值。y 为二维时各项按因变量列排列（coef 形状为 (p, t)）。
+    """
+    Y = y.reshape(len(y), -1) # A single target becomes one column
+    # Centre in float64 even when X is stored as float32: the Gram matrix squares the condition number
+    X_mean = X.mean(axis=0, dtype=np.float64)
+    # Per-target reductions below go column by column, so a stacked fit reproduces each separate fit
+    # bit for bit and near-ties between alphas are broken the same way
+    y_mean = np.array([Y[:, j].mean() for j in range(Y.shape[1])])
+    yc = Y - y_mean
+    Xc = X - X_mean
+    n, p = Xc.shape
+    if n < p:
+        # Dual form: eigenvectors of the n x n kernel are the left singular vectors of Xc
+        s2, U = np.linalg.eigh(Xc @ Xc.T)
+        s2 = np.clip(s2, 0.0, None)
+    else:
+        # Primal form: eigh of the p x p Gram matrix gives V and s^2; U = Xc V / s
+        s2, V = np.linalg.eigh(Xc.T @ Xc)
+        s2 = np.clip(s2, 0.0, None)
+        s = np.sqrt(s2)
+        XV = Xc @ V
+        # Directions with (numerically) zero eigenvalue get shrink 0, so their U column is unused.
+        # The cutoff is relative to the largest eigenvalue and does not grow with n.
+        nonzero = s2 > s2.max() * p * np.finfo(np.float64).eps
+        U = np.divide(XV, s, out=np.zeros_like(XV), where=nonzero)
+    UTy = np.column_stack([U.T @ yc[:, j] for j in range(Y.shape[1])])
+    best_alpha = np.full(Y.shape[1], np.nan)
+    best_mse = np.full(Y.shape[1], np.inf)
+
+    def loo_mse(alpha, rows=slice(None), targets=slice(None)):
+        # LOO residuals of the full-data fit, evaluated only on the given rows and target columns
+        shrink = s2 / (s2 + alpha)
+        # Hat-matrix diagonal includes 1/n for the unpenalized intercept
+        hat_diag = U[rows] ** 2 @ shrink + 1.0 / n
+        loo_resid = (yc[rows][:, targets] - U[rows] @ (shrink[:, None] * UTy[:, targets])) / (1.0 - hat_diag)[:, None]
+        return np.mean(loo_resid ** 2, axis=0)
+
+    # Each LOO evaluation is O(n * rank); on large samples a fixed row subset ranks the alphas
+    search_rows = slice(None)
+    if n > LOO_SAMPLE_MIN_ROWS:
+        search_rows = np.sort(np.random.default_rng(0).choice(n, LOO_SAMPLE_ROWS, replace=False))
+
+    def consider(alpha, j):
+        # Updates target j only, so each target's search is exactly what a separate fit would do
+        mse = loo_mse(alpha, search_rows, [j])[0]
+        if mse < best_mse[j]:
+            best_alpha[j], best_mse[j] = alpha, mse
+
+    for j in range(Y.shape[1]):
+        for alpha in alphas:
+            consider(alpha, j)
+        if refine:
+            step = np.log10(alphas[1] / alphas[0]) # Coarse grid spacing in decades
+            lo, hi = alphas[0], alphas[-1]
+            for _ in range(3): # Optimum on the grid edge: extend the grid outwards
+                if best_alpha[j] == hi:
+                    hi = hi * 10 ** step
+                    consider(hi, j)
+                elif best_alpha[j] == lo:
+                    lo = lo / 10 ** step
+                    consider(lo, j)
+                else:
+                    break
+            half_step = step / 2 # Bisect in log-space around the current best
+            while half_step > 0.2:
+                centre = np.log10(best_alpha[j])
+                consider(10 ** (centre - half_step), j)
+                consider(10 ** (centre + half_step), j)
+                half_step /= 2
+    if n > LOO_SAMPLE_MIN_ROWS: # Report the exact LOO MSE over all rows at the chosen alphas
+        best_mse = np.array([loo_mse(alpha)[j] for j, alpha in enumerate(best_alpha)])
+    if n < p:
+        coef = Xc.T @ (U @ (UTy / (s2[:, None] + best_alpha)))
+    else:
+        coef = V @ (s[:, None] / (s2[:, None] + best_alpha) * UTy)
+    intercept = y_mean - X_mean @ coef
+    # Fitted values from the same decomposition, so callers need not recompute X @ coef
+    y_hat = U @ (s2[:, None] / (s2[:, None] + best_alpha) * UTy) + y_mean
+    if y.ndim == 1:
+        return best_alpha[0], coef[:, 0], intercept[0], best_mse[0], y_hat[:, 0]
+    return best_alpha, coef, intercept, best_mse, y_hat
+
+
+# --- Function to Fit One Ridge Model Inside a Parallel Worker ---
+def fit_ridge(X, y, alphas, refine=False):
+    """
+    在并行任务中调用 ridge_cv_svd。异常作为返回值交回主线程，以便各模型仍按原顺序报告失败。
+
+    Args:
+        X (np.ndarray): 标准化后的自变量矩阵 (n, p)。
+        y (np.ndarray): 因变量 (n,)。
+        alphas (array-like): 候选正则化强度。
+        refine (bool): 是否在最优 alpha 附近细化搜索（见 ridge_cv_svd）。
+
+    Returns:
+        tuple | Exception: ridge_cv_svd 的结果，或拟合时抛出的异常。
+    """
+    try:
+        return ridge_cv_svd(X, y, alphas, refine=refine)
+    except Exception as e:
+        return e
 
 
 # --- Regression Analysis ---
+# Design matrices [const | X] built once per sample; the OLS, ridge and RLM models all read from them
+X1_const_np = build_design_matrix(final_df_model1, cols_m1)
+X2_const_np = build_design_matrix(final_df_model2, cols_m2)
 
 # --- Model 1: OLS (Baseline) ---
 print("\n--- 回归分析: 模型 1 (OLS, DV = debt_ratio_winsorized) ---")
+results1 = None # Stays None if Model 1 does not run; Model 5 then uses RLM's own OLS start
 if rows_after_model1 < len(reg_independent_vars) + 2:
      print(f"错误：模型1 清理后剩余数据过少 ({rows_after_model1} obs)，无法执行回归分析。")
 else:
     Y1 = final_df_model1['debt_ratio_winsorized']
-    X1_cols_for_reg = [col for col in reg_independent_vars if col in final_df_model1.columns]
-    X1 = final_df_model1[X1_cols_for_reg]
-    X1_const = sm.add_constant(X1)
+    X1_xnames = ['const'] + cols_m1
+    XtX1 = get_gram(final_df_model1, cols_m1, X1_const_np)
 
     try:
-        model1 = sm.OLS(Y1, X1_const)
+        model1 = sm.OLS(Y1.to_numpy(dtype=np.float64), X1_const_np)
         results1 = model1.fit()
         print("\n模型 1: OLS 结果")
-        print(results1.summary())
+        print(results1.summary(yname='debt_ratio_winsorized', xname=X1_xnames))
 
         # VIF Calculation
         print("\n模型 1: VIF 诊断")
-        vif_results1 = calculate_vif(final_df_model1, X1_cols_for_reg)
+        vif_results1 = calculate_vif(XtX1, cols_m1)
         print(vif_results1)
         high_vif = vif_results1[vif_results1['VIF'] > 5] # Common threshold
         if not high_vif.empty:
@@ -542,19 +886,18 @@ elif 'log_debt_ratio_winsorized' not in final_df_model2.columns:
      print("错误：模型2 的因变量 'log_debt_ratio_winsorized' 不存在。")
 else:
     Y2 = final_df_model2['log_debt_ratio_winsorized']
-    X2_cols_for_reg = [col for col in reg_independent_vars if col in final_df_model2.columns]
-    X2 = final_df_model2[X2_cols_for_reg]
-    X2_const = sm.add_constant(X2)
+    X2_xnames = ['const'] + cols_m2
+    XtX2 = get_gram(final_df_model2, cols_m2, X2_const_np) # Same as Model 1's when the rows match
 
     try:
-        model2 = sm.OLS(Y2, X2_const)
+        model2 = sm.OLS(Y2.to_numpy(dtype=np.float64), X2_const_np)
         results2 = model2.fit()
         print("\n模型 2: OLS 结果")
-        print(results2.summary())
+        print(results2.summary(yname='log_debt_ratio_winsorized', xname=X2_xnames))
 
         # VIF Calculation
         print("\n模型 2: VIF 诊断")
-        vif_results2 = calculate_vif(final_df_model2, X2_cols_for_reg)
+        vif_results2 = calculate_vif(XtX2, cols_m2)
         print(vif_results2)
         high_vif2 = vif_results2[vif_results2['VIF'] > 5]
         if not high_vif2.empty:
@@ -566,37 +909,61 @@ else:
         print(f"模型 2 OLS 回归执行失败: {e}")
 
 
+# --- Cap BLAS Threads for Models 3-5 ---
+# The ridge decompositions and RLM least-squares steps are p x p sized (p ~ 10); beyond a few
+# threads BLAS spends more time spawning/joining than computing. Restored after Model 5.
+regression_blas_threads = min(4, os.cpu_count() or 1)
+blas_limiter = threadpool_limits(limits=regression_blas_threads, user_api='blas')
+
+# --- Fit Ridge Models 3 and 4 Concurrently ---
+# Coarse alpha grid for RidgeCV (logarithmic scale is common); ridge_cv_svd refines around the best
+alphas = np.logspace(-6, 6, 5) # Example range
+ridge_inputs = {} # model number -> (scaled X, y)
+if rows_after_model1 >= len(reg_independent_vars) + 2:
+    # Scale features for Ridge
+    ridge_inputs[3] = (get_scaled(final_df_model1, cols_m1, X1_const_np),
+                       final_df_model1['debt_ratio_winsorized'].to_numpy(dtype=np.float64))
+if rows_after_model2 >= len(reg_independent_vars) + 2 and 'log_debt_ratio_winsorized' in final_df_model2.columns:
+    # Scale features (reuses Model 3's scaling when the sample rows are identical)
+    ridge_inputs[4] = (get_scaled(final_df_model2, cols_m2, X2_const_np),
+                       final_df_model2['log_debt_ratio_winsorized'].to_numpy(dtype=np.float64))
+
+if len(ridge_inputs) == 2 and ridge_inputs[3][0] is ridge_inputs[4][0]:
+    # Same rows and columns (get_scaled returned the cached matrix): one decomposition, both targets
+    ridge_fit_both = fit_ridge(ridge_inputs[3][0], np.column_stack([ridge_inputs[3][1], ridge_inputs[4][1]]), alphas, refine=True)
+    if isinstance(ridge_fit_both, Exception):
+        ridge_fits = {3: ridge_fit_both, 4: ridge_fit_both}
+    else:
+        ridge_fits = {model: tuple(part[..., j] for part in ridge_fit_both) for j, model in enumerate((3, 4))}
+else:
+    # Threads share the arrays without pickling (NumPy releases the GIL in BLAS/LAPACK); split the
+    # capped BLAS threads between the two fits so they do not oversubscribe the cores
+    with threadpool_limits(limits=max(1, regression_blas_threads // 2), user_api='blas'):
+        ridge_fits = dict(zip(ridge_inputs, Parallel(n_jobs=2, backend='threading')(
+            delayed(fit_ridge)(X, y, alphas, refine=True) for X, y in ridge_inputs.values())))
+
 # --- Model 3: Ridge Regression (Handles Multicollinearity) ---
 print("\n--- 回归分析: 模型 3 (RidgeCV, DV = debt_ratio_winsorized) ---")
 if rows_after_model1 < len(reg_independent_vars) + 2:
      print(f"错误：模型3 (Ridge) 数据过少 ({rows_after_model1} obs)，无法执行。")
 else:
-    Y1_ridge = final_df_model1['debt_ratio_winsorized']
-    X1_ridge_cols = [col for col in reg_independent_vars if col in final_df_model1.columns]
-    X1_ridge = final_df_model1[X1_ridge_cols]
-
-    # Scale features for Ridge
-    scaler = StandardScaler()
-    X1_ridge_scaled = scaler.fit_transform(X1_ridge)
-
-    # Define alphas for RidgeCV (logarithmic scale is common)
-    alphas = np.logspace(-6, 6, 13) # Example range
+    Y1_ridge = ridge_inputs[3][1]
 
     try:
-        # Use RidgeCV to find the best alpha
-        ridge_cv = RidgeCV(alphas=alphas, store_cv_values=True)
-        ridge_cv.fit(X1_ridge_scaled, Y1_ridge)
+        # Best alpha by leave-one-out CV (same criterion as RidgeCV) from a single SVD, fitted above
+        if isinstance(ridge_fits[3], Exception):
+            raise ridge_fits[3]
+        ridge_alpha, ridge_coef, ridge_intercept, ridge_loo_mse, ridge_fitted = ridge_fits[3]
 
         print(f"\n模型 3: RidgeCV 结果")
-        print(f"最佳 Alpha: {ridge_cv.alpha_}")
-        # Store coefficients with names
-        ridge_coefs = pd.Series(ridge_cv.coef_, index=X1_ridge_cols)
+        print(f"最佳 Alpha: {ridge_alpha}")
+        print(f"留一交叉验证 MSE: {ridge_loo_mse:.6f}")
         print("岭回归系数 (基于标准化数据):")
-        print(ridge_coefs.sort_values(ascending=False))
-        # Note: Intercept is calculated separately in RidgeCV
-        print(f"截距 (Intercept): {ridge_cv.intercept_}")
-        # R-squared can be calculated using score method
-        print(f"岭回归 R-squared: {ridge_cv.score(X1_ridge_scaled, Y1_ridge):.4f}")
+        print('\n'.join(f'{cols_m1[i]:<30} {ridge_coef[i]:+.6f}' for i in np.argsort(-ridge_coef)))
+        print(f"截距 (Intercept): {ridge_intercept}")
+        ridge_resid = Y1_ridge - ridge_fitted
+        ridge_r2 = 1 - (ridge_resid ** 2).sum() / ((Y1_ridge - Y1_ridge.mean()) ** 2).sum()
+        print(f"岭回归 R-squared: {ridge_r2:.4f}")
 
     except Exception as e:
         print(f"模型 3 Ridge 回归执行失败: {e}")
@@ -608,27 +975,22 @@ if rows_after_model2 < len(reg_independent_vars) + 2:
 elif 'log_debt_ratio_winsorized' not in final_df_model2.columns:
      print("错误：模型4 的因变量 'log_debt_ratio_winsorized' 不存在。")
 else:
-    Y2_ridge = final_df_model2['log_debt_ratio_winsorized']
-    X2_ridge_cols = [col for col in reg_independent_vars if col in final_df_model2.columns]
-    X2_ridge = final_df_model2[X2_ridge_cols]
-
-    # Scale features (can reuse scaler if fitted on same columns, but safer to refit)
-    scaler2 = StandardScaler()
-    X2_ridge_scaled = scaler2.fit_transform(X2_ridge)
-
-    alphas = np.logspace(-6, 6, 13)
+    Y2_ridge = ridge_inputs[4][1]
 
     try:
-        ridge_cv2 = RidgeCV(alphas=alphas, store_cv_values=True)
-        ridge_cv2.fit(X2_ridge_scaled, Y2_ridge)
+        if isinstance(ridge_fits[4], Exception):
+            raise ridge_fits[4]
+        ridge_alpha2, ridge_coef2, ridge_intercept2, ridge_loo_mse2, ridge_fitted2 = ridge_fits[4]
 
         print(f"\n模型 4: RidgeCV 结果 (Log DV)")
-        print(f"最佳 Alpha: {ridge_cv2.alpha_}")
-        ridge_coefs2 = pd.Series(ridge_cv2.coef_, index=X2_ridge_cols)
+        print(f"最佳 Alpha: {ridge_alpha2}")
+        print(f"留一交叉验证 MSE: {ridge_loo_mse2:.6f}")
         print("岭回归系数 (基于标准化数据):")
-        print(ridge_coefs2.sort_values(ascending=False))
-        print(f"截距 (Intercept): {ridge_cv2.intercept_}")
-        print(f"岭回归 R-squared: {ridge_cv2.score(X2_ridge_scaled, Y2_ridge):.4f}")
+        print('\n'.join(f'{cols_m2[i]:<30} {ridge_coef2[i]:+.6f}' for i in np.argsort(-ridge_coef2)))
+        print(f"截距 (Intercept): {ridge_intercept2}")
+        ridge_resid2 = Y2_ridge - ridge_fitted2
+        ridge_r2_2 = 1 - (ridge_resid2 ** 2).sum() / ((Y2_ridge - Y2_ridge.mean()) ** 2).sum()
+        print(f"岭回归 R-squared: {ridge_r2_2:.4f}")
 
     except Exception as e:
         print(f"模型 4 Ridge 回归执行失败: {e}")
@@ -639,37 +1001,64 @@ print("\n--- 回归分析: 模型 5 (RLM, DV = debt_ratio_winsorized) ---")
 if rows_after_model1 < len(reg_independent_vars) + 2:
      print(f"错误：模型5 (RLM) 数据过少 ({rows_after_model1} obs)，无法执行。")
 else:
-    Y1_rlm = final_df_model1['debt_ratio_winsorized']
-    X1_rlm_cols = [col for col in reg_independent_vars if col in final_df_model1.columns]
-    X1_rlm = final_df_model1[X1_rlm_cols]
-    X1_rlm_const = sm.add_constant(X1_rlm)
+    Y1_rlm = final_df_model1['debt_ratio_winsorized'].to_numpy(dtype=np.float64)
 
     try:
-        # Use Huber's T norm for robustness
-        rlm_model = sm.RLM(Y1_rlm, X1_rlm_const, M=sm.robust.norms.HuberT())
-        rlm_results = rlm_model.fit()
+        # Use Huber's T norm for robustness; same rows and design matrix as Model 1
+        rlm_model = sm.RLM(Y1_rlm, X1_const_np, M=sm.robust.norms.HuberT())
+        # RLM starts IRLS from OLS; hand it Model 1's OLS estimates instead of refitting them
+        rlm_results = rlm_model.fit(start_params=results1.params if results1 is not None else None)
         print("\n模型 5: RLM (HuberT) 结果")
-        print(rlm_results.summary())
+        if show_rlm_summary:
+            print(rlm_results.summary(yname='debt_ratio_winsorized', xname=X1_xnames))
+        else:
+            # Coefficients and scale come straight from the fit; the summary's covariance is skipped
+            rlm_params = rlm_results.params
+            print("RLM 系数:")
+            print('\n'.join(f'{X1_xnames[i]:<30} {rlm_params[i]:+.6f}' for i in np.argsort(-rlm_params)))
+            print(f"HuberT 尺度 (scale): {rlm_results.scale:.4f}")
         # Note: RLM summary doesn't provide R-squared directly in the same way OLS does.
         # Pseudo R-squared can be calculated if needed, but interpretation differs.
 
     except Exception as e:
         print(f"模型 5 RLM 回归执行失败: {e}")
 
+blas_limiter.restore_original_limits()
+
+# --- Function for Descriptive Statistics in One Pass ---
+def fast_describe(df):
+    """
+    与 df.describe() 输出相同的描述性统计（count, mean, std, min, 25%, 50%, 75%, max），
+    但对整个数值矩阵按列一次性计算，三个分位数共用一次 np.percentile。含缺失值时退回 describe()。
+
+    Args:
+        df (pd.DataFrame): 数值列组成的数据集。
+
+    Returns:
+        pd.DataFrame: 行为统计量、列为变量的统计表。
+    """
+    a = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(a).any():
+        return df.describe()
+    q25, q50, q75 = np.percentile(a, [25, 50, 75], axis=0)
+    stats = [np.full(a.shape[1], float(len(a))), a.mean(axis=0), a.std(axis=0, ddof=1),
+             a.min(axis=0), q25, q50, q75, a.max(axis=0)]
+    return pd.DataFrame(stats, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'], columns=df.columns)
+
 
 # --- Display Summary of Final Datasets Used in Regression ---
 print("\n--- 清理后用于回归的数据集描述性统计 ---")
 print("\n模型1, 3, 5 使用的数据集:")
 if rows_after_model1 > 0:
     with pd.option_context('display.float_format', '{:,.4f}'.format):
-        print(final_df_model1[[col for col in key_reg_vars_model1 if col in final_df_model1.columns]].describe())
+        print(fast_describe(final_df_model1[[col for col in key_reg_vars_model1 if col in final_df_model1.columns]]))
 else:
     print("数据集为空。")
 
 print("\n模型2, 4 使用的数据集:")
 if rows_after_model2 > 0:
     with pd.option_context('display.float_format', '{:,.4f}'.format):
-        print(final_df_model2[[col for col in key_reg_vars_model2 if col in final_df_model2.columns]].describe())
+        print(fast_describe(final_df_model2[[col for col in key_reg_vars_model2 if col in final_df_model2.columns]]))
 else:
     print("数据集为空。")
 
@@ -679,8 +1068,16 @@ if output_file_path:
     try:
         # Save the dataframe *before* dropping NAs for regression
         # final_df contains the new log columns and midpoint calculations
-        final_df.to_csv(output_file_path, index=False, encoding='utf-8-sig')
-        print(f"\n包含所有计算和诊断列的处理后数据已保存至 {output_file_path}")
+        parquet_output_path = os.path.splitext(output_file_path)[0] + '.parquet'
+        try:
+            final_df.to_parquet(parquet_output_path, engine='pyarrow', compression='zstd', index=False)
+            saved_path = parquet_output_path
+        except ImportError:
+            print("\n提示：未安装 pyarrow，改为保存 CSV。")
+            # Streamed in row chunks; floats keep full precision
+            final_df.to_csv(output_file_path, index=False, encoding='utf-8-sig', chunksize=100_000)
+            saved_path = output_file_path
+        print(f"\n包含所有计算和诊断列的处理后数据已保存至 {saved_path}")
     except Exception as e:
         print(f"\n保存处理后的数据时出错: {e}")
 